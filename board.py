@@ -1,3 +1,6 @@
+import numpy as np
+
+from nn import batch_feed_forward
 from player import BasePlayer
 
 
@@ -123,6 +126,72 @@ class Board (object):
                     player == self.get((0, 2)) and player == self.get((1, 1)) and player == self.get((2, 0)))
 
 
+# every winning line as flat (x * 3 + y) board indices, matching the layout NNPlayer feeds to its net
+WINNING_LINES = np.array([(0, 1, 2), (3, 4, 5), (6, 7, 8),
+                          (0, 3, 6), (1, 4, 7), (2, 5, 8),
+                          (0, 4, 8), (2, 4, 6)])
+
+
+def play_batch(weights, biases, player_one_ids, player_two_ids):
+    """
+    plays many games between neural nets at once, each game follows the same rules as Board.play with both players
+    choosing moves the same way as NNPlayer.play. As nets only ever play on empty squares there are no illegal moves
+    so every game moves in lockstep, finished games are simply frozen.
+    :param weights: per layer weight stacks for every net taking part, as returned by nn.unflatten_batch
+    :type weights: np.ndarray[]
+    :param biases: per layer bias stacks for every net taking part, as returned by nn.unflatten_batch
+    :type biases: np.ndarray[]
+    :param player_one_ids: for each game the index of the net playing first
+    :type player_one_ids: np.ndarray
+    :param player_two_ids: for each game the index of the net playing second
+    :type player_two_ids: np.ndarray
+    :return: the winner of each game (0: tie, 1: player one, 2: player two)
+    :rtype: np.ndarray
+    """
+
+    games = len(player_one_ids)
+    state = np.zeros((games, 9), dtype=int)
+    winners = np.zeros(games, dtype=int)
+    candidates = np.arange(9)
+    for turn in range(9):
+        current_id = turn % 2 + 1
+        net_ids = player_one_ids if current_id == 1 else player_two_ids
+        empty = state == 0
+        base = (state == current_id).astype(float) - ((state != 0) & (state != current_id))
+        # NNPlayer.play marks each candidate on the same view of the board, so the k-th candidate is ranked with
+        # every empty square up to and including it set to 1
+        marked = empty[:, :, None] & (candidates[:, None] <= candidates[None, :])
+        rankings = batch_feed_forward([w[net_ids] for w in weights], [b[net_ids] for b in biases],
+                                      base[:, :, None] + marked)[:, 0, :]
+        moves = np.argmax(np.where(empty, rankings, -np.inf), axis=1)
+
+        active = np.flatnonzero(winners == 0)
+        state[active, moves[active]] = current_id
+        won = np.all(state[active][:, WINNING_LINES] == current_id, axis=2).any(axis=1)
+        winners[active[won]] = current_id
+    return winners
+
+
+def score_batch(weights, biases, player_ids, opponent_ids):
+    """
+    plays every player against its opponent once in each seat, all in one batch
+    :param weights: per layer weight stacks for every net taking part, as returned by nn.unflatten_batch
+    :type weights: np.ndarray[]
+    :param biases: per layer bias stacks for every net taking part, as returned by nn.unflatten_batch
+    :type biases: np.ndarray[]
+    :param player_ids: for each pairing the index of the net being scored
+    :type player_ids: np.ndarray
+    :param opponent_ids: for each pairing the index of the opponents net
+    :type opponent_ids: np.ndarray
+    :return: the average score of each pairing for the player (1 for a win, 0.5 for a tie, 0 for a loss)
+    :rtype: np.ndarray
+    """
+
+    first = play_batch(weights, biases, player_ids, opponent_ids)
+    second = play_batch(weights, biases, opponent_ids, player_ids)
+    return ((first == 1) + 0.5 * (first == 0) + (second == 2) + 0.5 * (second == 0)) / 2
+
+
 if __name__ == '__main__':
     from player import HumanPlayer, NNPlayer
     one = HumanPlayer()
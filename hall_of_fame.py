@@ -0,0 +1,142 @@
+import numpy as np
+
+from board import score_batch
+from nn import unflatten_batch
+from player import NNPlayer
+
+
+class NoSamplesError(Exception):
+    def __init__(self):
+        super().__init__("please sample at least one leader so every bot has an opponent to be scored against")
+
+
+class NoCapacityError(Exception):
+    def __init__(self):
+        super().__init__("please give the hall of fame room for at least one leader")
+
+
+class HallOfFame(object):
+    """
+    A bounded store of past generation leaders used as a stable set of opponents for scoring bots.
+    Leaders are kept as rows of flattened neural net parameters, once full the oldest leader is replaced. A leader that
+    is already stored is not stored again, so kept elites do not push out older leaders.
+
+    Every bot in a generation is scored against the same sample of leaders so their scores can be compared, skipping
+    any leader that is the bot itself. As the
+    bots are deterministic a game between two unchanged nets always ends the same way, so the result of every pairing
+    is cached and only new pairings are played
+    """
+
+    def __init__(self, capacity, samples, net_shape=(9, 18, 9, 1)):
+        """
+        creates an empty hall of fame
+        :param capacity: the maximum number of leaders to keep
+        :type capacity: int
+        :param samples: the number of leaders each bot is scored against
+        :type samples: int
+        :param net_shape: the shape of the stored neural nets
+        :type net_shape: tuple
+        """
+
+        if capacity < 1:
+            raise NoCapacityError
+        if samples < 1:
+            raise NoSamplesError
+
+        self.capacity = capacity
+        self.samples = samples
+        self.net_shape = net_shape
+        self.params = np.zeros((capacity, sum(x * y + x for x, y in zip(net_shape[1:], net_shape[:-1]))))
+        self.generations = np.zeros(capacity, dtype=int)
+        self.added = 0
+        self.cache = {}
+
+    def __len__(self):
+        """
+        :return: the number of leaders currently stored
+        :rtype: int
+        """
+
+        return min(self.added, self.capacity)
+
+    def add(self, bot, generation):
+        """
+        stores a snapshot of a generations leader, replacing the oldest leader if full, unless it is already stored
+        :param bot: the leader to store
+        :type bot: NNPlayer
+        :param generation: the generation the bot lead
+        :type generation: int
+        """
+
+        params = bot.brain.flatten()
+        if np.all(self.params[:len(self)] == params, axis=1).any():
+            return
+
+        slot = self.added % self.capacity
+        self.params[slot] = params
+        self.generations[slot] = generation
+        self.added += 1
+
+    def sample(self):
+        """
+        picks one leader at random from each of samples equally sized age brackets so old and recent leaders are both
+        represented, every leader is used if there are not enough to fill the brackets
+        :return: the slots of the sampled leaders
+        :rtype: np.ndarray
+        """
+
+        by_age = np.argsort(self.generations[:len(self)])
+        if len(by_age) <= self.samples:
+            return by_age
+        return np.array([np.random.choice(bracket) for bracket in np.array_split(by_age, self.samples)])
+
+    def leaders(self):
+        """
+        rebuilds the stored leaders as bots, oldest first, for use as a reference panel
+        :return: the stored leaders
+        :rtype: NNPlayer[]
+        """
+
+        bots = []
+        for slot in np.argsort(self.generations[:len(self)]):
+            bot = NNPlayer(self.net_shape)
+            bot.brain.unflatten(self.params[slot])
+            bots.append(bot)
+        return bots
+
+    def evaluate(self, players):
+        """
+        scores every bot against one sample of leaders, playing any pairings not already cached in a single batch
+        :param players: the bots to score
+        :type players: NNPlayer[]
+        :return: the average score of each bot against the sampled leaders (1 for a win, 0.5 for a tie, 0 for a loss),
+            a bot whose only sampled leader is itself gets the tie score of 0.5
+        :rtype: np.ndarray
+        """
+
+        flat = [bot.brain.flatten() for bot in players]
+        keys = [params.tobytes() for params in flat]
+        sampled = [(self.params[slot].tobytes(), self.generations[slot], slot) for slot in self.sample()]
+        # a bot playing its own snapshot always ties, so that pairing tells us nothing
+        pairings = [[(key, generation, slot) for leader, generation, slot in sampled if leader != key] for key in keys]
+
+        # drop results for bots and leaders that are no longer around so the cache stays bounded
+        live_bots, live_leaders = set(keys), set(self.generations[:len(self)])
+        self.cache = {pairing: score for pairing, score in self.cache.items()
+                      if pairing[0] in live_bots and pairing[1] in live_leaders}
+
+        player_ids, leader_ids, new_pairings = [], [], {}
+        for player_id, bot_pairings in enumerate(pairings):
+            for key, generation, slot in bot_pairings:
+                if (key, generation) not in self.cache and (key, generation) not in new_pairings:
+                    player_ids.append(player_id)
+                    leader_ids.append(len(players) + slot)
+                    new_pairings[(key, generation)] = None
+
+        if new_pairings:
+            weights, biases = unflatten_batch(self.net_shape, np.vstack(flat + [self.params[:len(self)]]))
+            scores = score_batch(weights, biases, np.array(player_ids), np.array(leader_ids))
+            self.cache.update(zip(new_pairings, scores))
+
+        return np.array([np.mean([self.cache[(key, generation)] for key, generation, _ in bot_pairings])
+                         if bot_pairings else 0.5 for bot_pairings in pairings])
@@ -142,6 +142,37 @@ class Neural_Net(object):
 
         self.applyFunc(mutateFunc)
 
+    def flatten(self):
+        return np.concatenate([w.ravel() for w in self.weights] + [b.ravel() for b in self.biases])
+
+    def unflatten(self, flat):
+        weights, biases = unflatten_batch(self.layers, np.reshape(flat, [1, -1]))
+        self.weights = [w[0] for w in weights]
+        self.biases = [b[0] for b in biases]
+
+
+def unflatten_batch(layers, flat):
+    """
+    Splits a [n, nr_params] batch of flat parameter vectors (as produced by Neural_Net.flatten) back into per layer
+    weight stacks of shape [n, out, in] and bias stacks of shape [n, out, 1]
+    """
+    shapes = [(x, y) for x, y in zip(layers[1:], layers[:-1])] + [(x, 1) for x in layers[1:]]
+    offsets = np.cumsum([0] + [x * y for x, y in shapes])
+    stacks = [flat[:, start:end].reshape((len(flat),) + shape)
+              for start, end, shape in zip(offsets[:-1], offsets[1:], shapes)]
+    return stacks[:len(layers) - 1], stacks[len(layers) - 1:]
+
+
+def batch_feed_forward(weights, biases, X):
+    """
+    Feeds a batch of inputs of shape [n, nr_inputs, k] through n different networks at once, given as weight and bias
+    stacks from unflatten_batch. Returns the outputs with shape [n, nr_outputs, k]
+    """
+    a = X
+    for bias, weight in zip(biases, weights):
+        a = sigmoid(np.matmul(weight, a) + bias)
+    return a
+
 
 # Activation functions
 def sigmoid(x):
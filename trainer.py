@@ -1,8 +1,13 @@
 from queue import Queue
 from random import shuffle, choice
 from threading import Thread, Event, Lock
+from time import process_time
 
-from board import Board
+import numpy as np
+
+from board import Board, score_batch
+from hall_of_fame import HallOfFame
+from nn import unflatten_batch
 from player import NNPlayer
 
 
@@ -60,9 +65,12 @@ def run_generation(players, sub_generations, player_queue):
     return players
 
 
-def train(population_size, fraction_kept, generations, sub_generations, mutation_rate, threads=10):
+def train(population_size, fraction_kept, generations, sub_generations, mutation_rate, threads=10,
+          hall_of_fame_size=0, hall_of_fame_samples=8, panel=None, target_fitness=None):
     """
     trains the neural nets using genetic algorithem for a given number of generations
+    if a hall of fame is used bots are ranked on their score against past generation leaders, with elo only breaking
+    ties, so fewer sub generations are needed
 
     :param population_size: the number of bots to have in each generation
     :type population_size: int
@@ -76,16 +84,26 @@ def train(population_size, fraction_kept, generations, sub_generations, mutation
     :type mutation_rate: float
     :param threads: number of threads
     :type threads: int
-    :return: the best bot after generations generations
-    :rtype: NNPlayer
+    :param hall_of_fame_size: number of past leaders to keep in the hall of fame, 0 to rank on elo alone
+    :type hall_of_fame_size: int
+    :param hall_of_fame_samples: number of past leaders each bot is scored against
+    :type hall_of_fame_samples: int
+    :param panel: reference opponents the leader is scored against each generation, instead of logging its elo
+    :type panel: NNPlayer[]
+    :param target_fitness: stops early once the leader scores at least this against the panel
+    :type target_fitness: float
+    :return: the population after generations generations, best bot first
+    :rtype: NNPlayer[]
     """
 
     if population_size % 2 != 0:
         raise OddPopulationError
 
+    start_time = process_time()
     quit_event = Event()
     queue_lock = Lock()
     players = [NNPlayer() for _ in range(population_size)]
+    hall_of_fame = HallOfFame(hall_of_fame_size, hall_of_fame_samples) if hall_of_fame_size else None
     live_threads = []
     try:
         player_queue = Queue()
@@ -96,9 +114,18 @@ def train(population_size, fraction_kept, generations, sub_generations, mutation
             live_threads.append(thread)
 
         for generation in range(generations):
-            print(f"generation {generation} {players[0]}")
+            if panel is None:
+                print(f"generation {generation} {players[0]}")
+            elif reached_target(players[0], panel, target_fitness, generation, start_time):
+                break
             players = run_generation(players=players, sub_generations=sub_generations, player_queue=player_queue)
             players.sort(reverse=True)
+            if hall_of_fame is not None:
+                if len(hall_of_fame):
+                    fitness = hall_of_fame.evaluate(players)
+                    ranked = sorted(zip(fitness, players), key=lambda pair: pair[0], reverse=True)
+                    players = [player for _, player in ranked]
+                hall_of_fame.add(players[0], generation)
             players = players[:int(len(players) * fraction_kept)]
             i = 0
             while len(players) < population_size:
@@ -109,6 +136,9 @@ def train(population_size, fraction_kept, generations, sub_generations, mutation
                     new_player = NNPlayer()
 
                 players.append(new_player)
+        else:
+            if panel is not None:
+                reached_target(players[0], panel, target_fitness, generations, start_time)
     finally:
         quit_event.set()
         for thread in live_threads:
@@ -116,6 +146,120 @@ def train(population_size, fraction_kept, generations, sub_generations, mutation
         return players
 
 
+def panel_fitness(candidates, panel, layers):
+    """
+    scores every candidate against every bot in a fixed panel of reference opponents, playing once in each seat. All
+    the games are played in a single vectorised batch
+    :param candidates: the flattened neural nets to score, one per row
+    :type candidates: np.ndarray
+    :param panel: the reference opponents
+    :type panel: NNPlayer[]
+    :param layers: the shape of the candidates neural nets
+    :type layers: tuple
+    :return: the average score of each candidate (1 for a win, 0.5 for a tie, 0 for a loss)
+    :rtype: np.ndarray
+    """
+
+    weights, biases = unflatten_batch(layers, np.vstack([candidates] + [bot.brain.flatten() for bot in panel]))
+    candidate_ids = np.repeat(np.arange(len(candidates)), len(panel))
+    panel_ids = np.tile(np.arange(len(panel)), len(candidates)) + len(candidates)
+    scores = score_batch(weights, biases, candidate_ids, panel_ids)
+    return scores.reshape((len(candidates), len(panel))).mean(axis=1)
+
+
+def reached_target(bot, panel, target_fitness, generation, start_time):
+    """
+    scores a bot against a panel of reference opponents and logs the score with the CPU time spent so far, used by
+    both train and train_es so runs of the two can be compared like for like
+    :param bot: the bot to score
+    :type bot: NNPlayer
+    :param panel: the reference opponents
+    :type panel: NNPlayer[]
+    :param target_fitness: the score to stop training at, None to never stop early
+    :type target_fitness: float
+    :param generation: the current generation, for logging
+    :type generation: int
+    :param start_time: the process time training started at
+    :type start_time: float
+    :return: if the bot scored at least target_fitness
+    :rtype: bool
+    """
+
+    fitness = panel_fitness(bot.brain.flatten()[None], panel, bot.brain.layers)[0]
+    print(f"generation {generation} {fitness} after {process_time() - start_time:.2f} CPU seconds")
+    return target_fitness is not None and fitness >= target_fitness
+
+
+def centred_ranks(scores):
+    """
+    ranks scores onto [-0.5, 0.5] so an update only depends on their ordering. Tied scores share the average of their
+    ranks, the panel only allows a few distinct scores so ties are common
+    :param scores: the scores to rank
+    :type scores: np.ndarray
+    :return: the centred rank of each score
+    :rtype: np.ndarray
+    """
+
+    ranks = np.empty(len(scores))
+    ranks[np.argsort(scores)] = np.arange(len(scores))
+    _, tied = np.unique(scores, return_inverse=True)
+    ranks = (np.bincount(tied, weights=ranks) / np.bincount(tied))[tied]
+    return ranks / (len(scores) - 1) - 0.5
+
+
+def train_es(population_size, generations, sigma=0.1, learning_rate=0.03, panel=None, panel_size=16,
+             target_fitness=None, net_shape=(9, 18, 9, 1)):
+    """
+    trains a single neural net using evolution strategies, each generation the parent is perturbed with antithetic
+    gaussian noise, every perturbation is scored against a fixed panel of opponents and the parent is moved along the
+    rank weighted average of the noise
+
+    :param population_size: the number of perturbations to score each generation
+    :type population_size: int
+    :param generations: number of generations to train for
+    :type generations: int
+    :param sigma: standard deviation of the perturbations
+    :type sigma: float
+    :param learning_rate: step size of each update
+    :type learning_rate: float
+    :param panel: reference opponents to score against, such as saved bots or hall of fame leaders
+    :type panel: NNPlayer[]
+    :param panel_size: number of untrained reference opponents to make if no panel is given, these only give a weak
+        signal as the bots soon learn to beat them all
+    :type panel_size: int
+    :param target_fitness: stops early once the parent scores at least this against the panel
+    :type target_fitness: float
+    :param net_shape: the shape of the bots neural net
+    :type net_shape: tuple
+    :return: the trained bot, in a list to match train
+    :rtype: NNPlayer[]
+    """
+
+    if population_size % 2 != 0:
+        raise OddPopulationError
+
+    start_time = process_time()
+    if panel is None:
+        panel = [NNPlayer(net_shape) for _ in range(panel_size)]
+    parent = NNPlayer(net_shape)
+    params = parent.brain.flatten()
+
+    for generation in range(generations):
+        parent.brain.unflatten(params)
+        if reached_target(parent, panel, target_fitness, generation, start_time):
+            break
+
+        noise = np.random.randn(population_size // 2, len(params))
+        noise = np.vstack([noise, -noise])
+        fitness = panel_fitness(params + sigma * noise, panel, net_shape)
+        params = params + learning_rate / (population_size * sigma) * np.dot(centred_ranks(fitness), noise)
+    else:
+        parent.brain.unflatten(params)
+        reached_target(parent, panel, target_fitness, generations, start_time)
+
+    return [parent]
+
+
 if __name__ == '__main__':
     from player import HumanPlayer
 